@@ -1,17 +1,72 @@
-import nbimporter
+import asyncio
+import math
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+
+from app.preprocess_kernel import oneweek_features, warmup as _warmup_kernel
 from app.song import OneWeekSong, ThreeWeekSong
 import uvicorn
-from fastapi import FastAPI
-import pandas as pd
+from fastapi import FastAPI, Request
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import ORJSONResponse
+from starlette.concurrency import run_in_threadpool
+from pydantic import TypeAdapter, ValidationError
 import numpy as np
 import joblib
 
-app = FastAPI()
+_MODELS = {}
+
+# The exact column order each estimator was trained on; preprocessing
+# writes features into the row at these positions.
+_ONEWEEK_FEATURE_ORDER = ('popularity', 'log days_since_release') + \
+    tuple(f'log day_{i}' for i in range(7)) + \
+    ('1_day_%_change', '3_day_%_change', '6_day_%_change')
+_THREEWEEK_FEATURE_ORDER = tuple(f'log day_{i}' for i in range(21)) + \
+    ('popularity', 'log days_since_release')
+
+_EXPECTED_FEATURES = {
+    'lr_streampreds': _ONEWEEK_FEATURE_ORDER,
+    'rfr_streampreds': _ONEWEEK_FEATURE_ORDER,
+    'three_week_preds': _THREEWEEK_FEATURE_ORDER,
+}
+
+
+def _get_model(name):
+    # mmap_mode='r' memory-maps the arrays backing the estimators
+    # (tree splits, linear coefficients) read-only, so forked uvicorn
+    # workers share one copy instead of duplicating them in each RSS.
+    if name not in _MODELS:
+        model = joblib.load(
+            f'models/{name}.joblib', mmap_mode='r').best_estimator_
+        names = getattr(model, 'feature_names_in_', None)
+        if names is not None and tuple(names) != _EXPECTED_FEATURES[name]:
+            raise RuntimeError(
+                f"{name} was trained on a different feature order than "
+                "the preprocessing layout")
+        # Keep predict single-threaded: for the tiny batches served here
+        # joblib's parallel backend costs more than the tree walk itself.
+        if hasattr(model, 'n_jobs'):
+            model.n_jobs = 1
+        _MODELS[name] = model
+    return _MODELS[name]
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Warm all three models before the first request so nobody pays the
+    # load cost (and the mmap page faults) on a live request.
+    for name in ('lr_streampreds', 'rfr_streampreds', 'three_week_preds'):
+        _get_model(name)
+    # Pay the numba JIT compile up front as well.
+    _warmup_kernel()
+    yield
+
+
+# orjson serializes the tiny prediction payloads at the C level, where
+# the stdlib encoder is a visible fraction of total response time.
+app = FastAPI(lifespan=lifespan, default_response_class=ORJSONResponse)
 
 # the decorator @app.get('/') indicates that the function main() is in charge of handling GET requests that go to the path '/'
-one_week_lr = (joblib.load('models/lr_streampreds.joblib')).best_estimator_
-one_week_rfr = (joblib.load('models/rfr_streampreds.joblib')).best_estimator_
-three_week_lr = (joblib.load('models/three_week_preds.joblib')).best_estimator_
 
 
 @app.get('/')
@@ -19,68 +74,261 @@ def index():
     return {"message": "Stream predictions"}
 
 
-def oneweek_preprocess(request: OneWeekSong):
+# Feature-row buffers are recycled through small per-width free lists
+# instead of allocated per request. A row is only alive from preprocess
+# until the batch collector stacks it, and both ends run on the event-
+# loop thread, so plain lists are safe without locking.
+_ROW_POOL = {12: [], 23: []}
+_ROW_POOL_LIMIT = 64
 
-    song_dict = request.model_dump()
-    if any(val < 0 for val in song_dict.values()):
-        raise ValueError("All parameters must be positive values!")
 
-    song_df = pd.DataFrame([song_dict])
+def _take_row(width):
+    pool = _ROW_POOL[width]
+    return pool.pop() if pool else np.empty((1, width), dtype=np.float32)
 
-    for i in range(7):
-        # Add 1 to prevent taking the log of 0
-        song_df[f'day_{i}'] += 1
-        song_df[f'log day_{i}'] = np.log(song_df[f'day_{i}'])
 
-    # Add 1 to prevent taking the log of 0
-    song_df['log days_since_release'] = np.log(
-        song_df['days_since_release'] + 1)
+def _release_rows(rows):
+    for row in rows:
+        pool = _ROW_POOL[row.shape[1]]
+        if len(pool) < _ROW_POOL_LIMIT:
+            pool.append(row)
 
-    song_df['1_day_%_change'] = 100 * \
-        (song_df['day_0'] - song_df['day_1']) / song_df['day_1']
-    song_df['3_day_%_change'] = 100 * \
-        (song_df['day_0'] - song_df['day_3']) / song_df['day_3']
-    song_df['6_day_%_change'] = 100 * \
-        (song_df['day_0'] - song_df['day_6']) / song_df['day_6']
 
-    features = ['popularity', 'log days_since_release', 'log day_0', 'log day_1',
-                'log day_2', 'log day_3', 'log day_4', 'log day_5', 'log day_6',
-                '1_day_%_change', '3_day_%_change', '6_day_%_change']
+def oneweek_preprocess(request: OneWeekSong):
+    # Values are read straight off the validated model — no per-request
+    # model_dump() dict build. The ge=0 schema bounds already guarantee
+    # nonnegative inputs by the time a Song reaches preprocessing.
+    #
+    # Feature order: popularity, log days_since_release, log day_0..day_6,
+    # then the 1/3/6-day % changes (see _ONEWEEK_FEATURE_ORDER). The
+    # fused numba kernel writes the whole row in one call. float32
+    # halves the bytes moved through the dot product and matches the
+    # dtype sklearn's trees cast to internally anyway.
+    x = _take_row(12)
+    oneweek_features(float(request.popularity),
+                     float(request.days_since_release),
+                     float(request.day_0), float(request.day_1),
+                     float(request.day_2), float(request.day_3),
+                     float(request.day_4), float(request.day_5),
+                     float(request.day_6), x[0])
 
-    return song_df[features]
+    return x
 
 
 def threeweek_preprocess(request: ThreeWeekSong):
-    song_dict = request.model_dump()
-    if any(val < 0 for val in song_dict.values()):
-        raise ValueError("All parameters must be positive values!")
-
-    song_df = pd.DataFrame([song_dict])
-    for i in range(21):
-        # Add one to prevent taking the log of 0
-        song_df[f'log day_{i}'] = np.log(song_df[f'day_{i}'] + 1)
+    # Feature order: log day_0..day_20, then popularity and
+    # log days_since_release. One vectorized log1p over all 21 days
+    # replaces 21 separate scalar np.log calls (log1p also handles the
+    # +1 that prevents taking the log of 0).
+    days = np.fromiter((getattr(request, f'day_{i}') for i in range(21)),
+                       dtype=np.float64, count=21)
 
+    x = _take_row(23)
+    x[0, :21] = np.log1p(days)
+    x[0, 21] = request.popularity
     # Add one to prevent taking the log of 0
-    song_df['log days_since_release'] = np.log(
-        song_df['days_since_release'] + 1)
+    x[0, 22] = math.log(request.days_since_release + 1)
+
+    return x
+
+
+_ONEWEEK_FIELDS = ('popularity', 'days_since_release') + \
+    tuple(f'day_{i}' for i in range(7))
+_THREEWEEK_FIELDS = ('popularity', 'days_since_release') + \
+    tuple(f'day_{i}' for i in range(21))
+
+
+class _LRUCache:
+    """Bounded prediction cache; at 4096 entries it stays within a few MB."""
+
+    def __init__(self, maxsize=4096):
+        self._maxsize = maxsize
+        self._data = OrderedDict()
+
+    def get(self, key):
+        try:
+            self._data.move_to_end(key)
+        except KeyError:
+            return None
+        return self._data[key]
+
+    def put(self, key, value):
+        self._data[key] = value
+        self._data.move_to_end(key)
+        if len(self._data) > self._maxsize:
+            self._data.popitem(last=False)
+
+
+class _MicroBatcher:
+    """Coalesce concurrent single-row predictions into one batched call.
+
+    Requests enqueue their feature row and await a future; a collector
+    task drains the queue (up to max_batch rows or max_wait_ms), stacks
+    the rows into one matrix, runs predict_batch once and scatters the
+    per-row results back. sklearn's per-call overhead is then amortized
+    across the batch at the cost of at most max_wait_ms added latency.
+    """
+
+    def __init__(self, predict_batch, max_batch=64, max_wait_ms=5.0):
+        self._predict_batch = predict_batch
+        self._max_batch = max_batch
+        self._max_wait = max_wait_ms / 1000.0
+        self._loop = None
+        self._queue = None
+        self._task = None
+
+    async def predict(self, row):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._task.done():
+            # First use on this event loop (or the collector died):
+            # bind the queue and collector task to the running loop.
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._task = loop.create_task(self._collect())
+        future = loop.create_future()
+        self._queue.put_nowait((row, future))
+        return await future
+
+    async def _collect(self):
+        loop = self._loop
+        queue = self._queue
+        while True:
+            row, future = await queue.get()
+            rows, futures = [row], [future]
+            deadline = loop.time() + self._max_wait
+            while len(rows) < self._max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    row, future = await asyncio.wait_for(queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                rows.append(row)
+                futures.append(future)
+
+            batch = np.vstack(rows)
+            _release_rows(rows)
+            try:
+                # Only the model call leaves the event loop: the numpy/
+                # tree-walk work releases the GIL, and everything around
+                # it is cheap enough to stay inline.
+                results = await run_in_threadpool(
+                    self._predict_batch, batch)
+            except Exception as exc:  # scatter the failure to every waiter
+                for future in futures:
+                    if not future.done():
+                        future.set_exception(exc)
+            else:
+                for future, result in zip(futures, results):
+                    if not future.done():
+                        future.set_result(result)
+
+
+# One-week linear models whose coefficients get stacked into a single
+# matrix; adding another LR-style model is just another name here.
+_ONEWEEK_LINEAR_MODELS = ('lr_streampreds',)
+
+
+def _get_lr_ensemble():
+    # LinearRegression.predict is just x @ coef_ + intercept_, so the
+    # coefficients of every one-week linear model are extracted once and
+    # stacked: a single GEMV then yields all K linear predictions.
+    if 'lr_ensemble' not in _MODELS:
+        models = [_get_model(name) for name in _ONEWEEK_LINEAR_MODELS]
+        coef_t = np.vstack([m.coef_ for m in models]).T
+        intercept = np.array([m.intercept_ for m in models])
+        _MODELS['lr_ensemble'] = (coef_t, intercept)
+    return _MODELS['lr_ensemble']
+
+
+def _get_rfr_predict():
+    # Prefer the treelite-compiled forest (built offline by
+    # scripts/compile_rfr.py) for branch-free native tree traversal;
+    # fall back to the sklearn estimator when the shared library or the
+    # treelite runtime is unavailable.
+    if 'rfr_predict' not in _MODELS:
+        try:
+            import treelite_runtime
+            predictor = treelite_runtime.Predictor(
+                'models/rfr_streampreds.so')
+        except Exception:
+            _MODELS['rfr_predict'] = _get_model('rfr_streampreds').predict
+        else:
+            # atleast_1d: treelite returns a 0-d array for 1-row input
+            _MODELS['rfr_predict'] = lambda x: np.atleast_1d(
+                predictor.predict(treelite_runtime.DMatrix(x)))
+    return _MODELS['rfr_predict']
+
+
+def _oneweek_batch_predict(x):
+    coef_t, intercept = _get_lr_ensemble()
+    lr_preds = x @ coef_t + intercept  # (B, K); K linear models
+    rfr_preds = _get_rfr_predict()(x)
+    return list(zip(lr_preds[:, 0], rfr_preds))
+
+
+def _threeweek_batch_predict(x):
+    # The bound predict method is cached so the batch path skips the
+    # per-call attribute lookup on the estimator.
+    if 'three_week_predict' not in _MODELS:
+        _MODELS['three_week_predict'] = _get_model('three_week_preds').predict
+    return _MODELS['three_week_predict'](x)
+
+
+_oneweek_batcher = _MicroBatcher(_oneweek_batch_predict)
+_threeweek_batcher = _MicroBatcher(_threeweek_batch_predict)
+_oneweek_cache = _LRUCache()
+_threeweek_cache = _LRUCache()
+
+# Validating the raw JSON payload through a TypeAdapter skips FastAPI's
+# dependency-injection layer while keeping the pydantic schemas as the
+# single source of truth for what a valid Song looks like.
+_ONEWEEK_ADAPTER = TypeAdapter(OneWeekSong)
+_THREEWEEK_ADAPTER = TypeAdapter(ThreeWeekSong)
 
-    features = [f'log day_{i}' for i in range(
-        21)] + ['popularity', 'log days_since_release']
 
-    return song_df[features]
+async def _validate_body(request, adapter):
+    # Bad input has to surface as a 422 response, the same contract the
+    # dependency-injection layer provided, not escape as an unhandled
+    # exception and turn into a 500.
+    try:
+        payload = await request.json()
+    except Exception:
+        raise RequestValidationError(
+            [{'type': 'json_invalid', 'loc': ('body',),
+              'msg': 'Request body is not valid JSON', 'input': None}])
+    try:
+        return adapter.validate_python(payload)
+    except ValidationError as exc:
+        raise RequestValidationError(exc.errors())
 
 
 @app.post('/oneweek/predict')
-def predict(data: OneWeekSong):
-    df = oneweek_preprocess(data)
-    lr_preds = np.e**(one_week_lr.predict(df)[0])
-    rfr_preds = np.e**(one_week_rfr.predict(df)[0])
+async def predict_oneweek(request: Request):
+    data = await _validate_body(request, _ONEWEEK_ADAPTER)
+    key = tuple(getattr(data, field) for field in _ONEWEEK_FIELDS)
+    preds = _oneweek_cache.get(key)
+    if preds is None:
+        x = oneweek_preprocess(data)
+        lr_log, rfr_log = await _oneweek_batcher.predict(x)
+        # math.exp on a plain float beats the generic ** power dispatch,
+        # and plain floats keep JSON serialization off the numpy path.
+        preds = (math.exp(float(lr_log)), math.exp(float(rfr_log)))
+        _oneweek_cache.put(key, preds)
+    lr_preds, rfr_preds = preds
     return {"lr_preds": lr_preds, "rfr_preds": rfr_preds}
 
 
 @app.post('/threeweek/predict')
-def predict(data: ThreeWeekSong):
-    df = threeweek_preprocess(data)
-    three_week_preds = np.e**(three_week_lr.predict(df)[0])
+async def predict_threeweek(request: Request):
+    data = await _validate_body(request, _THREEWEEK_ADAPTER)
+    key = tuple(getattr(data, field) for field in _THREEWEEK_FIELDS)
+    three_week_preds = _threeweek_cache.get(key)
+    if three_week_preds is None:
+        x = threeweek_preprocess(data)
+        three_week_preds = math.exp(
+            float(await _threeweek_batcher.predict(x)))
+        _threeweek_cache.put(key, three_week_preds)
 
     return {"three_week_preds": three_week_preds}
@@ -1,39 +1,45 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, conint
 
 
 class OneWeekSong(BaseModel):
-    popularity: int
-    days_since_release: int
-    day_0: int
-    day_1: int
-    day_2: int
-    day_3: int
-    day_4: int
-    day_5: int
-    day_6: int
+    # frozen makes instances hashable and immutable; the ge=0 bound is
+    # enforced in pydantic's Rust core instead of Python-level checks.
+    model_config = {"frozen": True, "extra": "forbid"}
+
+    popularity: conint(ge=0)
+    days_since_release: conint(ge=0)
+    day_0: conint(ge=0)
+    day_1: conint(ge=0)
+    day_2: conint(ge=0)
+    day_3: conint(ge=0)
+    day_4: conint(ge=0)
+    day_5: conint(ge=0)
+    day_6: conint(ge=0)
 
 
 class ThreeWeekSong(BaseModel):
-    popularity: int
-    days_since_release: int
-    day_0: int
-    day_1: int
-    day_2: int
-    day_3: int
-    day_4: int
-    day_5: int
-    day_6: int
-    day_7: int
-    day_8: int
-    day_9: int
-    day_10: int
-    day_11: int
-    day_12: int
-    day_13: int
-    day_14: int
-    day_15: int
-    day_16: int
-    day_17: int
-    day_18: int
-    day_19: int
-    day_20: int
+    model_config = {"frozen": True, "extra": "forbid"}
+
+    popularity: conint(ge=0)
+    days_since_release: conint(ge=0)
+    day_0: conint(ge=0)
+    day_1: conint(ge=0)
+    day_2: conint(ge=0)
+    day_3: conint(ge=0)
+    day_4: conint(ge=0)
+    day_5: conint(ge=0)
+    day_6: conint(ge=0)
+    day_7: conint(ge=0)
+    day_8: conint(ge=0)
+    day_9: conint(ge=0)
+    day_10: conint(ge=0)
+    day_11: conint(ge=0)
+    day_12: conint(ge=0)
+    day_13: conint(ge=0)
+    day_14: conint(ge=0)
+    day_15: conint(ge=0)
+    day_16: conint(ge=0)
+    day_17: conint(ge=0)
+    day_18: conint(ge=0)
+    day_19: conint(ge=0)
+    day_20: conint(ge=0)
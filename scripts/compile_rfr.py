@@ -0,0 +1,18 @@
+"""Compile the one-week random forest to a native shared library.
+
+treelite emits straight-line C code per tree, so single-row inference
+skips sklearn's Python/Cython dispatch entirely. Run this offline after
+(re)training the model:
+
+    python scripts/compile_rfr.py
+
+The app picks up models/rfr_streampreds.so automatically when it exists
+and falls back to the sklearn estimator when it does not.
+"""
+import joblib
+import treelite
+
+rfr = joblib.load('models/rfr_streampreds.joblib').best_estimator_
+model = treelite.sklearn.import_model(rfr)
+model.export_lib(toolchain='gcc', libpath='models/rfr_streampreds.so',
+                 params={'parallel_comp': 8}, verbose=True)
@@ -1,5 +1,7 @@
+import math
+
 from fastapi.testclient import TestClient
-from app.main import app  # Adjust the import based on your app structure
+from app.main import app, oneweek_preprocess
 # Adjust based on your actual model imports
 from app.song import OneWeekSong, ThreeWeekSong
 import pytest
@@ -68,12 +70,14 @@ def test_threeweek_predict():
     assert response.status_code == 200
     assert "three_week_preds" in response.json()
 
-# Test for invalid input (negative values)
+# Golden values for the one-week feature row: logs of the +1-shifted
+# inputs and %-changes over the +1-shifted denominators, exactly what
+# the deployed models were trained on
 
 
-def test_oneweek_predict_invalid():
+def test_oneweek_preprocess_golden():
     data = OneWeekSong(
-        popularity=-10,
+        popularity=50,
         days_since_release=10,
         day_0=100,
         day_1=90,
@@ -83,35 +87,101 @@ def test_oneweek_predict_invalid():
         day_5=50,
         day_6=40
     )
-    with pytest.raises(ValueError) as exc_info:
-        client.post("/oneweek/predict", json=data.model_dump())
+    x = oneweek_preprocess(data)
+    expected = [
+        50,
+        math.log(11),
+        math.log(101),
+        math.log(91),
+        math.log(81),
+        math.log(71),
+        math.log(61),
+        math.log(51),
+        math.log(41),
+        100 * (100 - 90) / 91,
+        100 * (100 - 70) / 71,
+        100 * (100 - 40) / 41,
+    ]
+    assert x.shape == (1, 12)
+    assert list(x[0]) == pytest.approx(expected, rel=1e-5)
+
+# Zero-stream days are valid input (ge=0) and must not divide by zero
+
+
+def test_oneweek_predict_zero_days():
+    data = {
+        "popularity": 10,
+        "days_since_release": 0,
+        "day_0": 1,
+        "day_1": 0,
+        "day_2": 0,
+        "day_3": 0,
+        "day_4": 0,
+        "day_5": 0,
+        "day_6": 0
+    }
+    response = client.post("/oneweek/predict", json=data)
+    assert response.status_code == 200
+    assert "lr_preds" in response.json()
+    assert "rfr_preds" in response.json()
+
+# Test for invalid input (negative values)
+
+
+def test_oneweek_predict_invalid():
+    # Negative values are rejected by the ge=0 field constraints and
+    # reported as a 422, same as FastAPI's own validation would.
+    data = {
+        "popularity": -10,
+        "days_since_release": 10,
+        "day_0": 100,
+        "day_1": 90,
+        "day_2": 80,
+        "day_3": 70,
+        "day_4": 60,
+        "day_5": 50,
+        "day_6": 40
+    }
+    response = client.post("/oneweek/predict", json=data)
+    assert response.status_code == 422
 
 
 def test_threeweek_predict_invalid():
-    data = ThreeWeekSong(
-        popularity=50,
-        days_since_release=10,
-        day_0=100,
-        day_1=90,
-        day_2=80,
-        day_3=70,
-        day_4=60,
-        day_5=50,
-        day_6=40,
-        day_7=30,
-        day_8=20,
-        day_9=10,
-        day_10=5,
-        day_11=3,
-        day_12=2,
-        day_13=1,
-        day_14=0,
-        day_15=0,
-        day_16=0,
-        day_17=0,
-        day_18=0,
-        day_19=0,
-        day_20=-1  # Invalid negative value
-    )
-    with pytest.raises(ValueError) as exc_info:
-        client.post("/threeweek/predict", json=data.model_dump())
+    data = {
+        "popularity": 50,
+        "days_since_release": 10,
+        "day_0": 100,
+        "day_1": 90,
+        "day_2": 80,
+        "day_3": 70,
+        "day_4": 60,
+        "day_5": 50,
+        "day_6": 40,
+        "day_7": 30,
+        "day_8": 20,
+        "day_9": 10,
+        "day_10": 5,
+        "day_11": 3,
+        "day_12": 2,
+        "day_13": 1,
+        "day_14": 0,
+        "day_15": 0,
+        "day_16": 0,
+        "day_17": 0,
+        "day_18": 0,
+        "day_19": 0,
+        "day_20": -1  # Invalid negative value
+    }
+    response = client.post("/threeweek/predict", json=data)
+    assert response.status_code == 422
+
+
+def test_oneweek_predict_malformed_json():
+    response = client.post("/oneweek/predict", content=b"not json",
+                           headers={"Content-Type": "application/json"})
+    assert response.status_code == 422
+
+
+def test_oneweek_predict_missing_field():
+    response = client.post("/oneweek/predict", json={"popularity": 50})
+    assert response.status_code == 422